@@ -2,6 +2,8 @@ import streamlit as st
 from auth import show_auth_page
 from main_app import show_main_app
 from database import init_database
+from maintenance import maybe_run_maintenance
+from jobs import start_job_runner
 
 # ================================
 # CONFIGURAÇÃO DA APLICAÇÃO
@@ -129,6 +131,12 @@ def main():
     # Inicializa banco de dados
     init_database()
     
+    # Manutenção do banco em segundo plano (ANALYZE, vacuum, checkpoint, arquivo morto)
+    maybe_run_maintenance()
+    
+    # Fila de tarefas pesadas (exportação em lote, migração de corpos)
+    start_job_runner()
+    
     # Inicializa session state
     if 'user' not in st.session_state:
         st.session_state.user = None
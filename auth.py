@@ -3,6 +3,8 @@ import bcrypt
 import sqlite3
 import re
 from typing import Optional, Dict, Any
+from ratelimit import check_rate_limit, current_client_id
+from database import load_liked_posts, get_read_connection, run_write
 
 def hash_password(password: str) -> str:
     """Gera hash seguro da senha usando bcrypt."""
@@ -28,6 +30,14 @@ def validate_email(email: str) -> bool:
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
+def _insert_user(cursor: sqlite3.Cursor, email: str, name: Optional[str], password_hash: str) -> int:
+    """Grava o usuário (executado pelo escritor único)."""
+    cursor.execute(
+        "INSERT INTO users (email, name, password_hash) VALUES (?, ?, ?)",
+        (email, name, password_hash)
+    )
+    return cursor.lastrowid
+
 def create_user(email: str, name: Optional[str], password: str) -> tuple[bool, str]:
     """Cria um novo usuário no banco de dados."""
     if not validate_email(email):
@@ -37,8 +47,12 @@ def create_user(email: str, name: Optional[str], password: str) -> tuple[bool, s
     if not is_valid:
         return False, message
     
+    allowed, message = check_rate_limit('create_user', client=current_client_id())
+    if not allowed:
+        return False, message
+    
     try:
-        conn = sqlite3.connect('mathgram.db')
+        conn = get_read_connection()
         cursor = conn.cursor()
         
         # Verifica se email já existe
@@ -46,25 +60,28 @@ def create_user(email: str, name: Optional[str], password: str) -> tuple[bool, s
         if cursor.fetchone():
             conn.close()
             return False, "Email já registrado."
+        conn.close()
         
-        # Cria usuário
+        # Cria usuário (o bcrypt roda fora do escritor único)
         hashed_password = hash_password(password)
-        cursor.execute(
-            "INSERT INTO users (email, name, password_hash) VALUES (?, ?, ?)",
-            (email, name, hashed_password)
-        )
-        
-        conn.commit()
-        conn.close()
+        run_write(_insert_user, email, name, hashed_password)
         return True, "Usuário criado com sucesso!"
         
+    except sqlite3.IntegrityError:
+        # Cadastro concorrente com o mesmo email
+        return False, "Email já registrado."
     except Exception as e:
         return False, f"Erro ao criar usuário: {str(e)}"
 
-def authenticate_user(email: str, password: str) -> tuple[bool, Optional[Dict[str, Any]]]:
-    """Autentica usuário e retorna dados se válido."""
+def authenticate_user(email: str, password: str) -> tuple[bool, Optional[Dict[str, Any]], str]:
+    """Autentica usuário e retorna (sucesso, dados do usuário, mensagem)."""
+    # Limita antes do bcrypt, que é o custo que se quer proteger
+    allowed, message = check_rate_limit('authenticate_user', email.lower(), current_client_id())
+    if not allowed:
+        return False, None, message
+    
     try:
-        conn = sqlite3.connect('mathgram.db')
+        conn = get_read_connection()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -79,13 +96,12 @@ def authenticate_user(email: str, password: str) -> tuple[bool, Optional[Dict[st
                 'id': user[0],
                 'email': user[1],
                 'name': user[2] or email.split('@')[0]
-            }
+            }, "Login realizado."
         else:
-            return False, None
+            return False, None, "Email ou senha incorretos."
             
     except Exception as e:
-        st.error(f"Erro na autenticação: {str(e)}")
-        return False, None
+        return False, None, f"Erro na autenticação: {str(e)}"
 
 def show_auth_page():
     """Exibe página de login/cadastro."""
@@ -105,12 +121,13 @@ def show_auth_page():
                 if not email or not password:
                     st.markdown('<div class="error-message">Preencha todos os campos.</div>', unsafe_allow_html=True)
                 else:
-                    success, user_data = authenticate_user(email, password)
+                    success, user_data, message = authenticate_user(email, password)
                     if success:
                         st.session_state.user = user_data
+                        st.session_state.liked_cache = load_liked_posts(user_data['id'])
                         st.rerun()
                     else:
-                        st.markdown('<div class="error-message">Email ou senha incorretos.</div>', unsafe_allow_html=True)
+                        st.markdown(f'<div class="error-message">{message}</div>', unsafe_allow_html=True)
     
     with tab2:
         st.subheader("Criar Conta")
@@ -0,0 +1,156 @@
+import hashlib
+import sqlite3
+import zlib
+from typing import Dict, Any, Iterable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ================================
+# CONFIGURAÇÃO DO ARMAZENAMENTO DE CORPOS
+# ================================
+
+# Corpos a partir deste tamanho (bytes) saem da linha e vão para a tabela bodies
+BODY_STORE_MIN_SIZE = 512
+
+# Corpos a partir deste tamanho (bytes) são comprimidos
+COMPRESS_MIN_SIZE = 1024
+
+# Nível de compressão (zstd ou zlib)
+COMPRESSION_LEVEL = 6
+
+def init_body_store(cursor: sqlite3.Cursor):
+    """Cria a tabela de corpos endereçados por conteúdo."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bodies (
+            hash TEXT PRIMARY KEY,
+            encoding TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            stored_size INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def body_hash(text: str) -> str:
+    """Gera o endereço (SHA-256) de um corpo."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _encode(raw: bytes) -> tuple[str, bytes]:
+    """Comprime o corpo se compensar; retorna (encoding, dados)."""
+    if len(raw) < COMPRESS_MIN_SIZE:
+        return 'raw', raw
+    if zstandard is not None:
+        encoding, data = 'zstd', zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(raw)
+    else:
+        encoding, data = 'zlib', zlib.compress(raw, COMPRESSION_LEVEL)
+    if len(data) >= len(raw):
+        return 'raw', raw
+    return encoding, data
+
+def _decode(encoding: str, data: bytes) -> str:
+    """Descomprime um corpo armazenado."""
+    if encoding == 'zlib':
+        data = zlib.decompress(data)
+    elif encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Corpo comprimido com zstd, mas o pacote zstandard não está instalado.")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode('utf-8')
+
+def store_body(cursor: sqlite3.Cursor, text: str) -> Optional[str]:
+    """Guarda o corpo na tabela bodies se for grande o bastante.
+
+    Retorna o hash do corpo, ou None quando ele deve continuar na linha.
+    Corpos idênticos são armazenados uma única vez.
+    """
+    raw = text.encode('utf-8')
+    if len(raw) < BODY_STORE_MIN_SIZE:
+        return None
+
+    key = body_hash(text)
+    encoding, data = _encode(raw)
+    cursor.execute(
+        "INSERT OR IGNORE INTO bodies (hash, encoding, size, stored_size, data) VALUES (?, ?, ?, ?, ?)",
+        (key, encoding, len(raw), len(data), data)
+    )
+    return key
+
+def load_bodies(cursor: sqlite3.Cursor, hashes: Iterable[str]) -> Dict[str, str]:
+    """Carrega vários corpos numa única consulta."""
+    hashes = list(set(hashes))
+    bodies = {}
+    # Respeita o limite de parâmetros do SQLite
+    for start in range(0, len(hashes), 500):
+        batch = hashes[start:start + 500]
+        placeholders = ', '.join('?' for _ in batch)
+        cursor.execute(
+            f"SELECT hash, encoding, data FROM bodies WHERE hash IN ({placeholders})",
+            batch
+        )
+        for key, encoding, data in cursor.fetchall():
+            bodies[key] = _decode(encoding, data)
+    return bodies
+
+def has_inline_bodies(cursor: sqlite3.Cursor, table: str) -> bool:
+    """Verifica se ainda há corpos grandes guardados na linha da tabela."""
+    cursor.execute(
+        f"SELECT 1 FROM {table} WHERE body_hash IS NULL AND length(CAST(content AS BLOB)) >= ? LIMIT 1",
+        (BODY_STORE_MIN_SIZE,)
+    )
+    return cursor.fetchone() is not None
+
+def migrate_inline_bodies(cursor: sqlite3.Cursor, table: str, batch_size: int = 200) -> int:
+    """Move um lote de corpos grandes ainda guardados na linha para a tabela bodies.
+
+    Retorna quantas linhas foram migradas; 0 indica que não há mais o que migrar.
+    """
+    cursor.execute(
+        f"SELECT id, content FROM {table} WHERE body_hash IS NULL AND length(CAST(content AS BLOB)) >= ? LIMIT ?",
+        (BODY_STORE_MIN_SIZE, batch_size)
+    )
+    rows = cursor.fetchall()
+    for row_id, content in rows:
+        key = store_body(cursor, content)
+        cursor.execute(
+            f"UPDATE {table} SET body_hash = ?, content = '' WHERE id = ?",
+            (key, row_id)
+        )
+    return len(rows)
+
+def get_storage_report(cursor: sqlite3.Cursor, tables: Iterable[str] = ('posts', 'comments')) -> Dict[str, Any]:
+    """Resume a economia de espaço obtida com deduplicação e compressão."""
+    references: Dict[str, int] = {}
+    inline_rows = 0
+    for table in tables:
+        cursor.execute(f"SELECT body_hash, COUNT(*) FROM {table} WHERE body_hash IS NOT NULL GROUP BY body_hash")
+        for key, count in cursor.fetchall():
+            references[key] = references.get(key, 0) + count
+        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE body_hash IS NULL")
+        inline_rows += cursor.fetchone()[0]
+
+    cursor.execute("SELECT hash, size, stored_size, encoding FROM bodies")
+    logical_bytes = unique_bytes = stored_bytes = compressed = 0
+    bodies = 0
+    for key, size, stored_size, encoding in cursor.fetchall():
+        bodies += 1
+        logical_bytes += size * references.get(key, 0)
+        unique_bytes += size
+        stored_bytes += stored_size
+        if encoding != 'raw':
+            compressed += 1
+
+    return {
+        'bodies': bodies,
+        'compressed_bodies': compressed,
+        'references': sum(references.values()),
+        'inline_rows': inline_rows,
+        'logical_bytes': logical_bytes,
+        'unique_bytes': unique_bytes,
+        'stored_bytes': stored_bytes,
+        'saved_bytes': logical_bytes - stored_bytes,
+        'dedup_saved_bytes': logical_bytes - unique_bytes,
+        'compression_saved_bytes': unique_bytes - stored_bytes,
+    }
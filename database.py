@@ -1,26 +1,139 @@
 import sqlite3
 import hashlib
-from typing import List, Dict, Any
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional, Callable
+from latex_utils import validate_latex
+from ratelimit import check_rate_limit, current_client_id
+from bodystore import init_body_store, store_body, load_bodies
 
-def init_database():
-    """Inicializa o banco de dados SQLite com as tabelas necessárias."""
-    conn = sqlite3.connect('mathgram.db')
-    cursor = conn.cursor()
+DB_PATH = 'mathgram.db'
+ARCHIVE_DB_PATH = 'mathgram_archive.db'
+
+# Acima desse número de likes o conjunto da sessão é carregado aos poucos
+LIKED_CACHE_FULL_LOAD_LIMIT = 5000
+
+# Máximo de escritas confirmadas num mesmo COMMIT pelo escritor único
+WRITE_BATCH_SIZE = 64
+
+# Tempo máximo de espera pelo resultado de uma escrita (segundos)
+WRITE_TIMEOUT = 30
+
+_write_queue: "queue.Queue[tuple]" = queue.Queue()
+_writer_lock = threading.Lock()
+_writer_thread: Optional[threading.Thread] = None
+
+def get_connection(attach_archive: bool = True) -> sqlite3.Connection:
+    """Abre conexão de leitura e escrita, anexando o arquivo morto se existir.
     
-    # Tabela de usuários
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            name TEXT,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    Usada por tarefas em lote (manutenção, fila de tarefas); as escritas da
+    aplicação passam por run_write e as leituras por get_read_connection.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    if attach_archive and os.path.exists(ARCHIVE_DB_PATH):
+        conn.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_PATH,))
+    return conn
+
+def get_read_connection() -> sqlite3.Connection:
+    """Abre conexão somente leitura; em WAL ela lê um snapshot e nunca espera por escritas."""
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    if os.path.exists(ARCHIVE_DB_PATH):
+        conn.execute("ATTACH DATABASE ? AS archive", (f"file:{ARCHIVE_DB_PATH}?mode=ro",))
+    return conn
+
+def has_archive(conn: sqlite3.Connection) -> bool:
+    """Verifica se o arquivo morto está anexado à conexão."""
+    return any(row[1] == 'archive' for row in conn.execute("PRAGMA database_list"))
+
+# ================================
+# ESCRITOR ÚNICO
+# ================================
+
+def _write_loop():
+    """Executa as escritas da fila numa única conexão, agrupando-as em um COMMIT.
+    
+    Cada escrita roda num SAVEPOINT próprio: uma falha desfaz só ela. Os
+    resultados só são entregues depois do COMMIT do lote.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=WRITE_TIMEOUT, isolation_level=None, check_same_thread=False)
+    
+    while True:
+        batch = [_write_queue.get()]
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                batch.append(_write_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        # Escritas canceladas por timeout em run_write não são executadas
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        if not batch:
+            continue
+        
+        results = []
+        try:
+            # O arquivo morto pode ter sido criado pela manutenção depois da abertura
+            if not has_archive(conn) and os.path.exists(ARCHIVE_DB_PATH):
+                conn.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_PATH,))
+            
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for future, function, args in batch:
+                cursor.execute("SAVEPOINT write_item")
+                try:
+                    results.append((future, function(cursor, *args), None))
+                    cursor.execute("RELEASE write_item")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO write_item")
+                    cursor.execute("RELEASE write_item")
+                    results.append((future, None, e))
+            cursor.execute("COMMIT")
+            
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            results = [(future, None, e) for future, _, _ in batch]
+        
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+def submit_write(function: Callable, *args) -> Future:
+    """Agenda function(cursor, *args) no escritor único e retorna um Future com o resultado."""
+    global _writer_thread
+    if _writer_thread is None or not _writer_thread.is_alive():
+        with _writer_lock:
+            if _writer_thread is None or not _writer_thread.is_alive():
+                _writer_thread = threading.Thread(target=_write_loop, name="mathgram-writer", daemon=True)
+                _writer_thread.start()
     
+    future = Future()
+    _write_queue.put((future, function, args))
+    return future
+
+def run_write(function: Callable, *args):
+    """Executa uma escrita no escritor único e espera o resultado (ou a exceção).
+    
+    Se o prazo acabar com a escrita ainda na fila, ela é cancelada (não será
+    gravada depois); se já estiver em execução, espera-se o COMMIT do lote.
+    """
+    future = submit_write(function, *args)
+    try:
+        return future.result(timeout=WRITE_TIMEOUT)
+    except FutureTimeoutError:
+        if future.cancel():
+            raise TimeoutError("O banco está ocupado; a operação foi cancelada. Tente novamente.")
+        return future.result()
+
+def create_content_tables(cursor: sqlite3.Cursor, schema: str = 'main'):
+    """Cria as tabelas de posts, comentários e likes no schema indicado."""
     # Tabela de posts
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS posts (
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.posts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
             email TEXT NOT NULL,
@@ -34,8 +147,8 @@ def init_database():
     ''')
     
     # Tabela de comentários
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS comments (
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.comments (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             post_id INTEGER NOT NULL,
             user_id INTEGER NOT NULL,
@@ -49,8 +162,8 @@ def init_database():
     ''')
     
     # Tabela de likes
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS likes (
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.likes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             post_id INTEGER NOT NULL,
             user_id INTEGER NOT NULL,
@@ -61,6 +174,54 @@ def init_database():
         )
     ''')
     
+    # Corpos grandes ficam na tabela bodies, referenciados pelo hash
+    for table in ('posts', 'comments'):
+        cursor.execute(f"PRAGMA {schema}.table_info({table})")
+        if 'body_hash' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN body_hash TEXT")
+    
+    # Índices usados pelo feed e pela busca de comentários
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_posts_created_at ON posts (created_at)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_comments_post_id ON comments (post_id)")
+    # Conjunto de posts curtidos por usuário (cache de likes da sessão)
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_likes_user_id ON likes (user_id, post_id)")
+
+def init_database():
+    """Inicializa o banco de dados SQLite com as tabelas necessárias."""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    # Só tem efeito em bancos novos; bancos antigos são convertidos pela manutenção
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode = WAL")
+    
+    # Tabela de usuários
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            name TEXT,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    create_content_tables(cursor)
+    init_body_store(cursor)
+    
+    # Arquivo morto criado por versões antigas precisa das mesmas colunas e índices
+    if os.path.exists(ARCHIVE_DB_PATH):
+        cursor.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_PATH,))
+        create_content_tables(cursor, 'archive')
+    
+    # Versão dos likes de cada usuário, para invalidar caches de outras sessões
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS like_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
     conn.commit()
     conn.close()
 
@@ -69,42 +230,139 @@ def get_gravatar_url(email: str, size: int = 40) -> str:
     email_hash = hashlib.md5(email.lower().encode()).hexdigest()
     return f"https://www.gravatar.com/avatar/{email_hash}?s={size}&d=identicon"
 
-def get_posts() -> List[Dict[str, Any]]:
-    """Recupera todos os posts ordenados por data (mais recentes primeiro)."""
+def _row_to_post(row: tuple) -> Dict[str, Any]:
+    """Converte uma linha da consulta de posts em dicionário."""
+    return {
+        'id': row[0],
+        'user_id': row[1],
+        'email': row[2],
+        'author_name': row[3] or row[2].split('@')[0],
+        'title': row[4],
+        'content': row[5] if row[9] is None else None,  # carregado por load_post_bodies
+        'body_hash': row[9],
+        'likes': row[8],  # usar actual_likes
+        'created_at': row[7],
+        'avatar_url': get_gravatar_url(row[2])
+    }
+
+def get_posts(limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+    """Recupera posts ordenados por data (mais recentes primeiro).
+    
+    Quando a página passa do fim da tabela principal, a leitura continua
+    no arquivo morto, cujos posts são sempre mais antigos. Corpos guardados
+    na tabela bodies não são lidos aqui (ver load_post_bodies).
+    """
     try:
-        conn = sqlite3.connect('mathgram.db')
+        conn = get_read_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT p.id, p.user_id, p.email, p.author_name, p.title, p.content, 
-                   p.likes, p.created_at, COUNT(l.id) as actual_likes
-            FROM posts p
-            LEFT JOIN likes l ON p.id = l.post_id
+                   p.likes, p.created_at, COUNT(l.id) as actual_likes, p.body_hash
+            FROM main.posts p
+            LEFT JOIN main.likes l ON p.id = l.post_id
             GROUP BY p.id
             ORDER BY p.created_at DESC
-        ''')
+            LIMIT ? OFFSET ?
+        ''', (-1 if limit is None else limit, offset))
+        
+        posts = [_row_to_post(row) for row in cursor.fetchall()]
+        
+        if (limit is None or len(posts) < limit) and has_archive(conn):
+            archive_offset = 0
+            if not posts and offset:
+                cursor.execute("SELECT COUNT(*) FROM main.posts")
+                archive_offset = max(0, offset - cursor.fetchone()[0])
+            remaining = -1 if limit is None else limit - len(posts)
+            
+            # Likes de posts arquivados podem estar nas duas bases até a próxima varredura
+            cursor.execute('''
+                SELECT p.id, p.user_id, p.email, p.author_name, p.title, p.content, 
+                       p.likes, p.created_at,
+                       (SELECT COUNT(*) FROM archive.likes WHERE post_id = p.id) +
+                       (SELECT COUNT(*) FROM main.likes WHERE post_id = p.id) as actual_likes,
+                       p.body_hash
+                FROM archive.posts p
+                ORDER BY p.created_at DESC
+                LIMIT ? OFFSET ?
+            ''', (remaining, archive_offset))
+            posts.extend(_row_to_post(row) for row in cursor.fetchall())
+        
+        conn.close()
+        return posts
+        
+    except Exception as e:
+        print(f"Erro ao carregar posts: {str(e)}")
+        return []
+
+def load_post_bodies(posts: List[Dict[str, Any]]) -> None:
+    """Preenche, numa única consulta, o conteúdo dos posts guardado na tabela bodies."""
+    pending = [post for post in posts if post['content'] is None]
+    if not pending:
+        return
+    
+    try:
+        conn = get_read_connection()
+        bodies = load_bodies(conn.cursor(), [post['body_hash'] for post in pending])
+        conn.close()
+        
+        for post in pending:
+            post['content'] = bodies.get(post['body_hash'], '')
+        
+    except Exception as e:
+        print(f"Erro ao carregar conteúdo dos posts: {str(e)}")
+        for post in pending:
+            post['content'] = ''
+
+def get_user_posts(user_id: int) -> List[Dict[str, Any]]:
+    """Recupera todos os posts de um usuário, inclusive os arquivados."""
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor()
+        
+        query = '''
+            SELECT id, title, content, author_name, email, created_at, body_hash
+            FROM main.posts WHERE user_id = ?
+        '''
+        params = [user_id]
+        if has_archive(conn):
+            query += '''
+                UNION ALL
+                SELECT id, title, content, author_name, email, created_at, body_hash
+                FROM archive.posts WHERE user_id = ?
+            '''
+            params.append(user_id)
+        cursor.execute(query + " ORDER BY created_at DESC", params)
+        rows = cursor.fetchall()
+        bodies = load_bodies(cursor, [row[6] for row in rows if row[6] is not None])
         
         posts = []
-        for row in cursor.fetchall():
+        for row in rows:
             posts.append({
                 'id': row[0],
-                'user_id': row[1],
-                'email': row[2],
-                'author_name': row[3] or row[2].split('@')[0],
-                'title': row[4],
-                'content': row[5],
-                'likes': row[8],  # usar actual_likes
-                'created_at': row[7],
-                'avatar_url': get_gravatar_url(row[2])
+                'title': row[1],
+                'content': row[2] if row[6] is None else bodies.get(row[6], ''),
+                'author_name': row[3] or row[4].split('@')[0],
+                'created_at': row[5]
             })
         
         conn.close()
         return posts
         
     except Exception as e:
-        print(f"Erro ao carregar posts: {str(e)}")
+        print(f"Erro ao carregar posts do usuário: {str(e)}")
         return []
 
+def _insert_post(cursor: sqlite3.Cursor, user_id: int, email: str, author_name: str, title: str, content: str) -> int:
+    """Grava um post (executado pelo escritor único)."""
+    # Corpos grandes vão para a tabela bodies (deduplicados e comprimidos)
+    content_hash = store_body(cursor, content)
+    cursor.execute('''
+        INSERT INTO posts (user_id, email, author_name, title, content, body_hash)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (user_id, email, author_name, title, '' if content_hash else content, content_hash))
+    return cursor.lastrowid
+
 def create_post(user_id: int, email: str, author_name: str, title: str, content: str) -> tuple[bool, str]:
     """Cria um novo post."""
     if not title.strip():
@@ -112,95 +370,211 @@ def create_post(user_id: int, email: str, author_name: str, title: str, content:
     if not content.strip():
         return False, "Conteúdo é obrigatório."
     
+    is_valid, message = validate_latex(content)
+    if not is_valid:
+        return False, message
+    
+    allowed, message = check_rate_limit('create_post', user_id, current_client_id())
+    if not allowed:
+        return False, message
+    
     try:
-        conn = sqlite3.connect('mathgram.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO posts (user_id, email, author_name, title, content)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, email, author_name, title, content))
-        
-        conn.commit()
-        conn.close()
+        run_write(_insert_post, user_id, email, author_name, title, content)
         return True, "Post criado com sucesso!"
         
     except Exception as e:
         return False, f"Erro ao criar post: {str(e)}"
 
-def toggle_like(post_id: int, user_id: int) -> bool:
-    """Alterna o like de um post."""
-    try:
-        conn = sqlite3.connect('mathgram.db')
-        cursor = conn.cursor()
-        
-        # Verifica se já curtiu
+def _toggle_like(cursor: sqlite3.Cursor, post_id: int, user_id: int) -> tuple[bool, int]:
+    """Alterna o like (executado pelo escritor único); retorna (curtido, nova versão)."""
+    # Verifica se já curtiu
+    cursor.execute(
+        "SELECT id FROM likes WHERE post_id = ? AND user_id = ?",
+        (post_id, user_id)
+    )
+    existing_like = cursor.fetchone()
+    
+    archived_like = None
+    if not existing_like and has_archive(cursor.connection):
         cursor.execute(
-            "SELECT id FROM likes WHERE post_id = ? AND user_id = ?",
+            "SELECT id FROM archive.likes WHERE post_id = ? AND user_id = ?",
             (post_id, user_id)
         )
-        existing_like = cursor.fetchone()
-        
-        if existing_like:
-            # Remove like
-            cursor.execute(
-                "DELETE FROM likes WHERE post_id = ? AND user_id = ?",
-                (post_id, user_id)
-            )
-        else:
-            # Adiciona like
-            cursor.execute(
-                "INSERT INTO likes (post_id, user_id) VALUES (?, ?)",
-                (post_id, user_id)
-            )
+        archived_like = cursor.fetchone()
+    
+    if existing_like:
+        # Remove like
+        cursor.execute(
+            "DELETE FROM likes WHERE post_id = ? AND user_id = ?",
+            (post_id, user_id)
+        )
+    elif archived_like:
+        # Remove like de post já arquivado
+        cursor.execute(
+            "DELETE FROM archive.likes WHERE post_id = ? AND user_id = ?",
+            (post_id, user_id)
+        )
+    else:
+        # Adiciona like
+        cursor.execute(
+            "INSERT INTO likes (post_id, user_id) VALUES (?, ?)",
+            (post_id, user_id)
+        )
+    
+    cursor.execute('''
+        INSERT INTO like_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+    ''', (user_id,))
+    cursor.execute("SELECT version FROM like_versions WHERE user_id = ?", (user_id,))
+    return not (existing_like or archived_like), cursor.fetchone()[0]
+
+def toggle_like(post_id: int, user_id: int, liked_cache: Optional[Dict[str, Any]] = None) -> tuple[bool, str]:
+    """Alterna o like de um post.
+    
+    Se liked_cache (ver load_liked_posts) for informado, ele é atualizado
+    no lugar; se outra sessão tiver mudado os likes nesse meio tempo, o
+    cache é marcado como desatualizado.
+    """
+    allowed, message = check_rate_limit('toggle_like', user_id, current_client_id())
+    if not allowed:
+        return False, message
+    
+    try:
+        liked, version = run_write(_toggle_like, post_id, user_id)
+        
+        if liked_cache is not None:
+            if liked_cache['version'] == version - 1:
+                if liked:
+                    liked_cache['post_ids'].add(post_id)
+                else:
+                    liked_cache['post_ids'].discard(post_id)
+                liked_cache['checked_ids'].add(post_id)
+                liked_cache['version'] = version
+            else:
+                liked_cache['version'] = None
+        return True, "Curtida atualizada."
         
-        conn.commit()
+    except Exception as e:
+        return False, f"Erro ao curtir post: {str(e)}"
+
+def get_like_version(user_id: int) -> Optional[int]:
+    """Retorna a versão atual dos likes do usuário."""
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT version FROM like_versions WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
         conn.close()
-        return True
+        return row[0] if row else 0
         
     except Exception as e:
-        print(f"Erro ao curtir post: {str(e)}")
-        return False
+        print(f"Erro ao consultar versão dos likes: {str(e)}")
+        return None
 
-def user_liked_post(post_id: int, user_id: int) -> bool:
-    """Verifica se usuário já curtiu o post."""
+def _liked_post_ids(cursor: sqlite3.Cursor, conn: sqlite3.Connection, user_id: int,
+                    post_ids: Optional[List[int]] = None) -> set:
+    """Consulta os posts curtidos pelo usuário (todos ou só entre post_ids)."""
+    schemas = ['main', 'archive'] if has_archive(conn) else ['main']
+    filter_sql = ''
+    params: List[Any] = [user_id]
+    if post_ids is not None:
+        filter_sql = f" AND post_id IN ({', '.join('?' for _ in post_ids)})"
+        params += post_ids
+    
+    liked = set()
+    for schema in schemas:
+        cursor.execute(f"SELECT post_id FROM {schema}.likes WHERE user_id = ?{filter_sql}", params)
+        liked.update(row[0] for row in cursor.fetchall())
+    return liked
+
+def load_liked_posts(user_id: int) -> Dict[str, Any]:
+    """Carrega o conjunto de posts curtidos pelo usuário para guardar na sessão.
+    
+    Para usuários com muitos likes o conjunto começa vazio ('complete' falso)
+    e é preenchido por página com load_liked_posts_chunk.
+    """
+    cache = {
+        'user_id': user_id,
+        'version': None,
+        'post_ids': set(),
+        'checked_ids': set(),
+        'complete': False
+    }
     try:
-        conn = sqlite3.connect('mathgram.db')
+        conn = get_read_connection()
         cursor = conn.cursor()
         
-        cursor.execute(
-            "SELECT id FROM likes WHERE post_id = ? AND user_id = ?",
-            (post_id, user_id)
-        )
-        result = cursor.fetchone()
+        # A versão é lida antes dos likes: uma mudança concorrente força recarga
+        cursor.execute("SELECT version FROM like_versions WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        cache['version'] = row[0] if row else 0
+        
+        cursor.execute("SELECT COUNT(*) FROM likes WHERE user_id = ?", (user_id,))
+        if cursor.fetchone()[0] <= LIKED_CACHE_FULL_LOAD_LIMIT:
+            cache['post_ids'] = _liked_post_ids(cursor, conn, user_id)
+            cache['complete'] = True
+        
         conn.close()
         
-        return result is not None
+    except Exception as e:
+        print(f"Erro ao carregar likes do usuário: {str(e)}")
+    return cache
+
+def load_liked_posts_chunk(liked_cache: Dict[str, Any], post_ids: List[int]) -> None:
+    """Completa o cache com os likes dos posts ainda não verificados."""
+    if liked_cache['complete']:
+        return
+    pending = [post_id for post_id in post_ids if post_id not in liked_cache['checked_ids']]
+    if not pending:
+        return
+    
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor()
+        liked_cache['post_ids'].update(_liked_post_ids(cursor, conn, liked_cache['user_id'], pending))
+        liked_cache['checked_ids'].update(pending)
+        conn.close()
         
     except Exception as e:
-        return False
+        print(f"Erro ao carregar likes do usuário: {str(e)}")
 
 def get_comments(post_id: int) -> List[Dict[str, Any]]:
     """Recupera comentários de um post."""
     try:
-        conn = sqlite3.connect('mathgram.db')
+        conn = get_read_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT id, user_id, email, author_name, content, created_at
-            FROM comments
-            WHERE post_id = ?
-            ORDER BY created_at ASC
-        ''', (post_id,))
+        if has_archive(conn):
+            # Comentários de posts arquivados ficam no arquivo morto
+            cursor.execute('''
+                SELECT id, user_id, email, author_name, content, created_at, body_hash
+                FROM archive.comments
+                WHERE post_id = ?
+                UNION ALL
+                SELECT id, user_id, email, author_name, content, created_at, body_hash
+                FROM main.comments
+                WHERE post_id = ?
+                ORDER BY created_at ASC
+            ''', (post_id, post_id))
+        else:
+            cursor.execute('''
+                SELECT id, user_id, email, author_name, content, created_at, body_hash
+                FROM comments
+                WHERE post_id = ?
+                ORDER BY created_at ASC
+            ''', (post_id,))
+        
+        rows = cursor.fetchall()
+        bodies = load_bodies(cursor, [row[6] for row in rows if row[6] is not None])
         
         comments = []
-        for row in cursor.fetchall():
+        for row in rows:
             comments.append({
                 'id': row[0],
                 'user_id': row[1],
                 'email': row[2],
                 'author_name': row[3] or row[2].split('@')[0],
-                'content': row[4],
+                'content': row[4] if row[6] is None else bodies.get(row[6], ''),
                 'created_at': row[5],
                 'avatar_url': get_gravatar_url(row[2])
             })
@@ -212,22 +586,26 @@ def get_comments(post_id: int) -> List[Dict[str, Any]]:
         print(f"Erro ao carregar comentários: {str(e)}")
         return []
 
+def _insert_comment(cursor: sqlite3.Cursor, post_id: int, user_id: int, email: str, author_name: str, content: str) -> int:
+    """Grava um comentário (executado pelo escritor único)."""
+    content_hash = store_body(cursor, content)
+    cursor.execute('''
+        INSERT INTO comments (post_id, user_id, email, author_name, content, body_hash)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (post_id, user_id, email, author_name, '' if content_hash else content, content_hash))
+    return cursor.lastrowid
+
 def create_comment(post_id: int, user_id: int, email: str, author_name: str, content: str) -> tuple[bool, str]:
     """Cria um novo comentário."""
     if not content.strip():
         return False, "Comentário não pode estar vazio."
     
+    allowed, message = check_rate_limit('create_comment', user_id, current_client_id())
+    if not allowed:
+        return False, message
+    
     try:
-        conn = sqlite3.connect('mathgram.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO comments (post_id, user_id, email, author_name, content)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (post_id, user_id, email, author_name, content))
-        
-        conn.commit()
-        conn.close()
+        run_write(_insert_comment, post_id, user_id, email, author_name, content)
         return True, "Comentário adicionado!"
         
     except Exception as e:
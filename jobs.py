@@ -0,0 +1,479 @@
+import io
+import json
+import multiprocessing
+import sqlite3
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Any, Optional
+from database import DB_PATH, get_connection, get_user_posts, has_archive
+from bodystore import has_inline_bodies, migrate_inline_bodies, get_storage_report
+from latex_utils import export_to_tex
+
+# ================================
+# CONFIGURAÇÃO DA FILA DE TAREFAS
+# ================================
+
+# Processos do pool de execução; só são marcadas como em execução
+# tantas tarefas quantos processos estiverem livres
+MAX_WORKERS = 2
+
+# O progresso só é gravado quando avança ao menos isso...
+PROGRESS_MIN_STEP = 0.01
+
+# ...ou quando passou esse tempo desde a última gravação (segundos)
+PROGRESS_MIN_INTERVAL = 2.0
+
+# Intervalo entre consultas da fila pelo despachante (segundos)
+POLL_INTERVAL = 0.5
+
+# Resultados (ex.: .zip exportado) são apagados depois desse prazo (horas)
+JOB_RESULT_TTL_HOURS = 24
+
+# Tarefas encerradas são removidas depois desse prazo (dias)
+JOB_RETENTION_DAYS = 30
+
+# Estados possíveis de uma tarefa
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+# Registro de tipos de tarefa: nome -> (função, concorrência, tentativas)
+_job_types: Dict[str, Dict[str, Any]] = {}
+
+_runner_lock = threading.Lock()
+_runner_thread: Optional[threading.Thread] = None
+
+class JobCancelled(Exception):
+    """Levantada dentro da tarefa quando o cancelamento foi solicitado."""
+
+def _connect() -> sqlite3.Connection:
+    """Abre conexão com timeout maior, já que várias sessões e processos escrevem na fila."""
+    return sqlite3.connect(DB_PATH, timeout=30)
+
+def init_jobs_table():
+    """Cria a tabela da fila de tarefas."""
+    conn = _connect()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_type TEXT NOT NULL,
+            user_id INTEGER,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress REAL DEFAULT 0,
+            result BLOB,
+            error TEXT,
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 3,
+            cancel_requested INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, job_type)")
+    conn.commit()
+    conn.close()
+
+def register_job(job_type: str, concurrency: int = 1, max_attempts: int = 3):
+    """Decorador que registra uma função como tipo de tarefa.
+
+    A função recebe (payload, report_progress) e roda em outro processo,
+    portanto precisa ser definida no nível do módulo. O retorno (bytes ou
+    texto) fica disponível em get_job_result(job_id) até expirar.
+    """
+    def decorator(function: Callable):
+        _job_types[job_type] = {
+            'function': function,
+            'concurrency': concurrency,
+            'max_attempts': max_attempts,
+        }
+        return function
+    return decorator
+
+def enqueue_job(job_type: str, payload: Dict[str, Any], user_id: Optional[int] = None) -> Optional[int]:
+    """Coloca uma tarefa na fila e retorna seu id."""
+    if job_type not in _job_types:
+        print(f"Tipo de tarefa desconhecido: {job_type}")
+        return None
+
+    try:
+        conn = _connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO jobs (job_type, user_id, payload, max_attempts) VALUES (?, ?, ?, ?)",
+            (job_type, user_id, json.dumps(payload), _job_types[job_type]['max_attempts'])
+        )
+        job_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return job_id
+
+    except Exception as e:
+        print(f"Erro ao enfileirar tarefa: {str(e)}")
+        return None
+
+def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    """Recupera estado e progresso de uma tarefa (o resultado fica em get_job_result)."""
+    try:
+        conn = _connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, job_type, user_id, status, progress, result IS NOT NULL, error, attempts, created_at
+            FROM jobs WHERE id = ?
+        ''', (job_id,))
+        row = cursor.fetchone()
+        conn.close()
+
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'job_type': row[1],
+            'user_id': row[2],
+            'status': row[3],
+            'progress': row[4] or 0.0,
+            'has_result': bool(row[5]),
+            'error': row[6],
+            'attempts': row[7],
+            'created_at': row[8]
+        }
+
+    except Exception as e:
+        print(f"Erro ao consultar tarefa: {str(e)}")
+        return None
+
+def get_job_result(job_id: int) -> Optional[bytes]:
+    """Lê o resultado de uma tarefa concluída (None se não houver ou já expirou)."""
+    try:
+        conn = _connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT result FROM jobs WHERE id = ? AND status = ?", (job_id, JOB_DONE))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    except Exception as e:
+        print(f"Erro ao ler resultado da tarefa: {str(e)}")
+        return None
+
+def purge_old_jobs(conn: sqlite3.Connection) -> int:
+    """Apaga resultados expirados e tarefas encerradas antigas; retorna quantas linhas mudaram."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs'")
+    if cursor.fetchone() is None:
+        return 0
+
+    cursor.execute(
+        "UPDATE jobs SET result = NULL WHERE result IS NOT NULL AND updated_at < datetime('now', ?)",
+        (f"-{int(JOB_RESULT_TTL_HOURS)} hours",)
+    )
+    changed = cursor.rowcount
+    cursor.execute(
+        "DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < datetime('now', ?)",
+        (JOB_DONE, JOB_FAILED, JOB_CANCELLED, f"-{int(JOB_RETENTION_DAYS)} days")
+    )
+    changed += cursor.rowcount
+    conn.commit()
+    return changed
+
+def cancel_job(job_id: int) -> bool:
+    """Cancela uma tarefa na fila ou pede o cancelamento de uma em execução."""
+    try:
+        conn = _connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = ?",
+            (JOB_CANCELLED, job_id, JOB_QUEUED)
+        )
+        cancelled = cursor.rowcount > 0
+        if not cancelled:
+            cursor.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, JOB_RUNNING)
+            )
+            cancelled = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return cancelled
+
+    except Exception as e:
+        print(f"Erro ao cancelar tarefa: {str(e)}")
+        return False
+
+# ================================
+# EXECUÇÃO (PROCESSO DO POOL)
+# ================================
+
+def _make_progress_reporter(job_id: int) -> Callable[[float], None]:
+    """Cria a função que a tarefa usa para publicar progresso e checar cancelamento.
+
+    As gravações são espaçadas para não disputar o lock de escrita do
+    SQLite a cada item; o cancelamento é checado a cada chamada, só com leitura.
+    """
+    last_write = {'progress': 0.0, 'time': time.monotonic()}
+
+    def report_progress(fraction: float):
+        fraction = max(0.0, min(1.0, fraction))
+        now = time.monotonic()
+        conn = _connect()
+        try:
+            cursor = conn.cursor()
+            advanced = fraction - last_write['progress']
+            if advanced >= PROGRESS_MIN_STEP or (advanced > 0 and now - last_write['time'] >= PROGRESS_MIN_INTERVAL):
+                cursor.execute(
+                    "UPDATE jobs SET progress = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (fraction, job_id)
+                )
+                conn.commit()
+                last_write.update(progress=fraction, time=now)
+            cursor.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,))
+            cancel_requested = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        if cancel_requested:
+            raise JobCancelled()
+    return report_progress
+
+def _execute_job(job_id: int, job_type: str, payload: str):
+    """Ponto de entrada no processo do pool."""
+    function = _job_types[job_type]['function']
+    result = function(json.loads(payload), _make_progress_reporter(job_id))
+    if isinstance(result, str):
+        result = result.encode('utf-8')
+    return result
+
+# ================================
+# DESPACHANTE (THREAD NO PROCESSO DO STREAMLIT)
+# ================================
+
+def _finish_job(job_id: int, future: Future):
+    """Grava o resultado de uma tarefa concluída, agendando nova tentativa se falhou."""
+    conn = _connect()
+    try:
+        cursor = conn.cursor()
+        try:
+            result = future.result()
+            cursor.execute('''
+                UPDATE jobs SET status = ?, progress = 1, result = ?, error = NULL,
+                                updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (JOB_DONE, result, job_id))
+        except JobCancelled:
+            cursor.execute(
+                "UPDATE jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (JOB_CANCELLED, job_id)
+            )
+        except Exception as e:
+            # Volta para a fila enquanto houver tentativas restantes
+            # (inclui BrokenProcessPool, quando o processo da tarefa morre)
+            cursor.execute('''
+                UPDATE jobs SET status = CASE WHEN attempts < max_attempts AND cancel_requested = 0
+                                              THEN ? ELSE ? END,
+                                error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (JOB_QUEUED, JOB_FAILED, str(e), job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _claim_jobs(cursor: sqlite3.Cursor, slots: Dict[str, int], free_workers: int) -> list[tuple]:
+    """Marca como em execução até `free_workers` tarefas, na ordem da fila.
+
+    `slots` limita quantas tarefas de cada tipo ainda podem começar.
+    Retorna (id, tipo, payload) das tarefas marcadas.
+    """
+    job_types = [job_type for job_type, count in slots.items() if count > 0]
+    if free_workers <= 0 or not job_types:
+        return []
+
+    placeholders = ', '.join('?' for _ in job_types)
+    cursor.execute(
+        f"SELECT id, job_type, payload FROM jobs WHERE status = ? AND job_type IN ({placeholders}) ORDER BY id",
+        (JOB_QUEUED, *job_types)
+    )
+    claimed = []
+    for job_id, job_type, payload in cursor.fetchall():
+        if len(claimed) >= free_workers:
+            break
+        if slots[job_type] <= 0:
+            continue
+        cursor.execute('''
+            UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = ?
+        ''', (JOB_RUNNING, job_id, JOB_QUEUED))
+        if cursor.rowcount > 0:
+            claimed.append((job_id, job_type, payload))
+            slots[job_type] -= 1
+    return claimed
+
+def _new_executor() -> ProcessPoolExecutor:
+    """Cria o pool de processos das tarefas."""
+    # spawn: processos criados por fork herdariam o estado de locks do SQLite
+    return ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+
+def _requeue_job(job_id: int, error: str):
+    """Devolve à fila uma tarefa que não chegou a ser enviada ao pool."""
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts - 1, error = ? WHERE id = ?",
+            (JOB_QUEUED, error, job_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _dispatch_loop():
+    """Distribui tarefas da fila para o pool respeitando os processos livres e a concorrência de cada tipo."""
+    executor = _new_executor()
+    running: Dict[str, Dict[int, Future]] = {job_type: {} for job_type in _job_types}
+
+    while True:
+        for job_type, futures in running.items():
+            for job_id, future in list(futures.items()):
+                if not future.done():
+                    continue
+                try:
+                    _finish_job(job_id, future)
+                    # Só sai da lista depois de gravado; senão tenta de novo na próxima volta
+                    futures.pop(job_id)
+                except Exception as e:
+                    print(f"Erro ao finalizar tarefa {job_id}: {str(e)}")
+
+        # Só marca como em execução o que o pool consegue começar agora
+        free_workers = MAX_WORKERS - sum(len(futures) for futures in running.values())
+        slots = {
+            job_type: _job_types[job_type]['concurrency'] - len(futures)
+            for job_type, futures in running.items()
+        }
+        claimed = []
+        if free_workers > 0:
+            conn = _connect()
+            try:
+                claimed = _claim_jobs(conn.cursor(), slots, free_workers)
+                conn.commit()
+            except Exception as e:
+                print(f"Erro no despachante de tarefas: {str(e)}")
+                claimed = []
+            finally:
+                conn.close()
+
+        for job_id, job_type, payload in claimed:
+            futures = running[job_type]
+            try:
+                try:
+                    futures[job_id] = executor.submit(_execute_job, job_id, job_type, payload)
+                except BrokenProcessPool:
+                    # Um processo morreu e o pool não aceita mais tarefas: recria
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = _new_executor()
+                    futures[job_id] = executor.submit(_execute_job, job_id, job_type, payload)
+            except Exception as e:
+                print(f"Erro ao enviar tarefa {job_id}: {str(e)}")
+                try:
+                    _requeue_job(job_id, str(e))
+                except Exception as e:
+                    print(f"Erro ao devolver tarefa {job_id} à fila: {str(e)}")
+
+        time.sleep(POLL_INTERVAL)
+
+def _content_tables(conn: sqlite3.Connection) -> list[str]:
+    """Tabelas cujos corpos podem ir para a tabela bodies."""
+    tables = ['posts', 'comments']
+    if has_archive(conn):
+        tables += ['archive.posts', 'archive.comments']
+    return tables
+
+def _enqueue_body_migration():
+    """Enfileira a migração de corpos se houver linhas antigas e nenhuma migração pendente."""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM jobs WHERE job_type = 'migrate_bodies' AND status IN (?, ?)",
+            (JOB_QUEUED, JOB_RUNNING)
+        )
+        pending = cursor.fetchone() is not None
+        needed = not pending and any(has_inline_bodies(cursor, table) for table in _content_tables(conn))
+        conn.close()
+
+        if needed:
+            enqueue_job('migrate_bodies', {})
+
+    except Exception as e:
+        print(f"Erro ao verificar migração de corpos: {str(e)}")
+
+def start_job_runner():
+    """Inicia (uma única vez por processo) o pool e o despachante de tarefas."""
+    global _runner_thread
+    with _runner_lock:
+        if _runner_thread is not None and _runner_thread.is_alive():
+            return
+
+        init_jobs_table()
+
+        # Tarefas interrompidas por um reinício voltam para a fila
+        conn = _connect()
+        conn.execute(
+            "UPDATE jobs SET status = ? WHERE status = ?",
+            (JOB_QUEUED, JOB_RUNNING)
+        )
+        conn.commit()
+        conn.close()
+
+        _enqueue_body_migration()
+
+        _runner_thread = threading.Thread(target=_dispatch_loop, name="mathgram-jobs", daemon=True)
+        _runner_thread.start()
+
+# ================================
+# TAREFAS
+# ================================
+
+@register_job('export_tex', concurrency=2)
+def export_user_posts(payload: Dict[str, Any], report_progress: Callable[[float], None]) -> bytes:
+    """Exporta todos os posts de um usuário como arquivos .tex num .zip."""
+    posts = get_user_posts(payload['user_id'])
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for index, post in enumerate(posts):
+            tex_content = export_to_tex(post['title'], post['content'], post['author_name'])
+            safe_title = post['title'].replace(' ', '_').replace('/', '_')
+            archive.writestr(f"{post['id']}_{safe_title}.tex", tex_content)
+            report_progress((index + 1) / len(posts))
+    return buffer.getvalue()
+
+@register_job('migrate_bodies', concurrency=1)
+def migrate_bodies(payload: Dict[str, Any], report_progress: Callable[[float], None]) -> str:
+    """Move corpos grandes de posts e comentários existentes para a tabela bodies."""
+    batch_size = payload.get('batch_size', 200)
+    conn = get_connection()
+    cursor = conn.cursor()
+    tables = _content_tables(conn)
+
+    migrated = 0
+    for index, table in enumerate(tables):
+        while True:
+            count = migrate_inline_bodies(cursor, table, batch_size)
+            conn.commit()
+            if count == 0:
+                break
+            migrated += count
+        report_progress((index + 1) / len(tables))
+
+    report = get_storage_report(cursor, tables)
+    conn.close()
+    report['migrated_rows'] = migrated
+    print(
+        f"Migração de corpos: {migrated} linhas migradas; {report['bodies']} corpos "
+        f"({report['compressed_bodies']} comprimidos) para {report['references']} referências; "
+        f"{report['logical_bytes']} bytes lógicos em {report['stored_bytes']} armazenados "
+        f"(economia de {report['saved_bytes']}: {report['dedup_saved_bytes']} por deduplicação, "
+        f"{report['compression_saved_bytes']} por compressão)."
+    )
+    return json.dumps(report)
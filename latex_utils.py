@@ -1,5 +1,17 @@
+import hashlib
+import re
+import streamlit as st
 import streamlit.components.v1 as components
 from datetime import datetime
+from typing import List, Dict, Any
+
+# Delimitadores de bloco matemático: (abertura, fechamento, display)
+MATH_DELIMITERS = [
+    ('$$', '$$', True),
+    ('\\[', '\\]', True),
+    ('\\(', '\\)', False),
+    ('$', '$', False),
+]
 
 def escape_html(text: str) -> str:
     """Escapa caracteres HTML para prevenir injeção."""
@@ -9,10 +21,245 @@ def escape_html(text: str) -> str:
                 .replace('"', '&quot;')
                 .replace("'", '&#x27;'))
 
+def _line_of(content: str, index: int) -> int:
+    """Retorna o número da linha (1-based) de uma posição do conteúdo."""
+    return content.count('\n', 0, index) + 1
+
+def _find_closing(content: str, delimiter: str, start: int) -> int:
+    """Procura o delimitador de fechamento ignorando caracteres escapados."""
+    i = start
+    while i < len(content):
+        if content.startswith(delimiter, i):
+            return i
+        i += 2 if content[i] == '\\' else 1
+    return -1
+
+def _find_closing_brace(content: str, start: int) -> int:
+    """Procura a chave que fecha a chave aberta em start - 1."""
+    depth = 1
+    i = start
+    while i < len(content):
+        char = content[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return -1
+
+def _braces_balanced(body: str) -> bool:
+    """Verifica se as chaves de um bloco matemático estão balanceadas."""
+    depth = 0
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth < 0:
+                return False
+        i += 1
+    return depth == 0
+
+def parse_latex_segments(content: str) -> List[Dict[str, Any]]:
+    """Divide o conteúdo em segmentos de texto e de matemática.
+
+    Cada segmento é um dicionário com 'type' ('text', 'math' ou 'chem'),
+    'raw' (trecho original, com delimitadores), 'body' (sem delimitadores)
+    e 'display'. Delimitadores sem fechamento geram um segmento de
+    texto com a chave 'error' preenchida; um $ solto vira texto com a
+    chave 'warning'.
+    """
+    segments = []
+    text_start = 0
+    i = 0
+
+    def flush_text(end: int):
+        if end > text_start:
+            raw = content[text_start:end]
+            segments.append({'type': 'text', 'raw': raw, 'body': raw, 'display': False})
+
+    def add_block(kind: str, raw: str, body: str, display: bool, line: int):
+        segment = {
+            'type': kind,
+            'raw': raw,
+            'body': body,
+            'display': display,
+        }
+        if not _braces_balanced(body):
+            segment['error'] = f"Chaves desbalanceadas no bloco da linha {line}."
+        segments.append(segment)
+
+    while i < len(content):
+        if content.startswith('\\ce{', i):
+            end = _find_closing_brace(content, i + 4)
+            flush_text(i)
+            if end == -1:
+                segments.append({
+                    'type': 'text', 'raw': content[i:], 'body': content[i:], 'display': False,
+                    'error': f"\\ce{{ sem }} correspondente na linha {_line_of(content, i)}."
+                })
+                return segments
+            add_block('chem', content[i:end + 1], content[i:end + 1], False, _line_of(content, i))
+            i = text_start = end + 1
+            continue
+
+        for opening, closing, display in MATH_DELIMITERS:
+            if content.startswith(opening, i):
+                break
+        else:
+            opening = None
+
+        if opening is None:
+            if content.startswith('\\]', i) or content.startswith('\\)', i):
+                flush_text(i)
+                segments.append({
+                    'type': 'text', 'raw': content[i:i + 2], 'body': content[i:i + 2], 'display': False,
+                    'error': f"{content[i:i + 2]} sem abertura correspondente na linha {_line_of(content, i)}."
+                })
+                i = text_start = i + 2
+                continue
+            # Comandos e escapes (ex.: \$) são tratados como texto
+            i += 2 if content[i] == '\\' else 1
+            continue
+
+        end = _find_closing(content, closing, i + len(opening))
+        if end == -1 and opening == '$':
+            # $ solto (ex.: "R$ 50,00") é exibido como texto pelo KaTeX
+            flush_text(i)
+            segments.append({
+                'type': 'text', 'raw': '$', 'body': '$', 'display': False,
+                'warning': f"$ sem $ correspondente na linha {_line_of(content, i)} (será exibido como texto)."
+            })
+            i = text_start = i + 1
+            continue
+        flush_text(i)
+        if end == -1:
+            segments.append({
+                'type': 'text', 'raw': content[i:], 'body': content[i:], 'display': False,
+                'error': f"{opening} sem {closing} correspondente na linha {_line_of(content, i)}."
+            })
+            return segments
+        add_block('math', content[i:end + len(closing)], content[i + len(opening):end],
+                  display, _line_of(content, i))
+        i = text_start = end + len(closing)
+
+    flush_text(len(content))
+    return segments
+
+def validate_latex(content: str) -> tuple[bool, str]:
+    """Valida o balanceamento dos delimitadores LaTeX do conteúdo."""
+    for segment in parse_latex_segments(content):
+        if 'error' in segment:
+            return False, segment['error']
+    return True, "LaTeX válido."
+
+def latex_warnings(content: str) -> List[str]:
+    """Lista avisos que não impedem a publicação (ex.: $ sem fechamento)."""
+    return [segment['warning'] for segment in parse_latex_segments(content) if 'warning' in segment]
+
+def _render_math_block(segment: Dict[str, Any]) -> str:
+    """Gera o HTML escapado de um bloco matemático para o auto-render do KaTeX."""
+    # \ce{} fora de delimitadores precisa de modo matemático no KaTeX
+    source = f"${segment['raw']}$" if segment['type'] == 'chem' else segment['raw']
+    tag = 'div' if segment['display'] else 'span'
+    return f'<{tag} class="math-block">{escape_html(source)}</{tag}>'
+
+def render_segments_html(segments: List[Dict[str, Any]]) -> str:
+    """Monta o HTML escapado do conteúdo a partir dos segmentos."""
+    parts = []
+    for segment in segments:
+        if segment['type'] == 'text':
+            parts.append(escape_html(segment['raw']))
+        else:
+            parts.append(_render_math_block(segment))
+    return ''.join(parts)
+
+def latex_search_text(content: str) -> str:
+    """Extrai texto pesquisável: texto corrido e corpo das fórmulas, sem delimitadores."""
+    parts = []
+    for segment in parse_latex_segments(content):
+        body = segment['body'].strip()
+        if body:
+            parts.append(body)
+    return ' '.join(parts)
+
+# Caracteres com significado em Markdown, escapados nos trechos de texto do preview
+MARKDOWN_SPECIAL = set('\\`*_{}[]()#+-.!|<>~$')
+
+def escape_markdown(text: str) -> str:
+    """Escapa caracteres de Markdown (inclusive $) para exibir o texto literalmente."""
+    return ''.join('\\' + char if char in MARKDOWN_SPECIAL else char for char in text)
+
+def block_hash(kind: str, source: str) -> str:
+    """Gera a chave de um bloco do preview a partir do seu conteúdo."""
+    return hashlib.sha1(f"{kind}\0{source}".encode('utf-8')).hexdigest()[:16]
+
+def preview_blocks(segments: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Agrupa os segmentos em blocos independentes para o preview.
+
+    Fórmulas em display viram blocos 'latex'; texto e fórmulas inline são
+    reunidos em parágrafos 'markdown', separados por linhas em branco. Cada
+    bloco tem 'kind', 'source' e 'hash'.
+    """
+    blocks = []
+    paragraph = []
+
+    def flush_paragraph():
+        source = ''.join(paragraph).strip()
+        paragraph.clear()
+        if source:
+            blocks.append({'kind': 'markdown', 'source': source, 'hash': block_hash('markdown', source)})
+
+    for segment in segments:
+        if segment['type'] == 'text' or 'error' in segment:
+            # Blocos com erro são exibidos como texto, igual ao que será publicado
+            parts = re.split(r'\n\s*\n', segment['raw'])
+            paragraph.append(escape_markdown(parts[0]))
+            for part in parts[1:]:
+                flush_paragraph()
+                paragraph.append(escape_markdown(part))
+        elif segment['display']:
+            flush_paragraph()
+            source = segment['body'].strip()
+            blocks.append({'kind': 'latex', 'source': source, 'hash': block_hash('latex', source)})
+        else:
+            source = segment['raw'] if segment['type'] == 'chem' else segment['body'].strip()
+            paragraph.append(f"${source}$")
+    flush_paragraph()
+    return blocks
+
+def render_latex_blocks(content: str, key_prefix: str = "latex") -> None:
+    """Renderiza o conteúdo como um elemento do Streamlit por bloco.
+
+    Cada bloco fica num container com chave derivada do seu hash: ao editar
+    um documento longo, o frontend mantém os blocos inalterados e só
+    substitui os que mudaram.
+    """
+    occurrences: Dict[str, int] = {}
+    for block in preview_blocks(parse_latex_segments(content)):
+        # Blocos idênticos no mesmo documento precisam de chaves distintas
+        occurrence = occurrences.get(block['hash'], 0)
+        occurrences[block['hash']] = occurrence + 1
+        with st.container(key=f"{key_prefix}-{block['hash']}-{occurrence}"):
+            if block['kind'] == 'latex':
+                st.latex(block['source'])
+            else:
+                st.markdown(block['source'])
+
 def render_latex(content: str, element_id: str = "math-content") -> None:
     """Renderiza conteúdo LaTeX usando KaTeX."""
-    # Escapa o conteúdo para prevenir injeção de HTML/JS
-    safe_content = escape_html(content)
+    # Escapa o conteúdo (bloco a bloco) para prevenir injeção de HTML/JS
+    safe_content = render_segments_html(parse_latex_segments(content))
     
     # HTML com KaTeX
     html_content = f"""
@@ -93,6 +340,16 @@ def render_latex(content: str, element_id: str = "math-content") -> None:
     
     components.html(html_content, height=None, scrolling=True)
 
+def _segments_to_tex(segments: List[Dict[str, Any]]) -> str:
+    """Converte segmentos para LaTeX, trocando $$...$$ (obsoleto) por \\[...\\]."""
+    parts = []
+    for segment in segments:
+        if segment['type'] == 'math' and segment['raw'].startswith('$$'):
+            parts.append(f"\\[{segment['body']}\\]")
+        else:
+            parts.append(segment['raw'])
+    return ''.join(parts)
+
 def export_to_tex(title: str, content: str, author: str) -> str:
     """Gera conteúdo LaTeX para exportação."""
     current_date = datetime.now().strftime("%d/%m/%Y")
@@ -114,7 +371,7 @@ def export_to_tex(title: str, content: str, author: str) -> str:
     tex_content += f"\\date{{{current_date}}}\n\n"
     tex_content += "\\begin{document}\n\n"
     tex_content += "\\maketitle\n\n"
-    tex_content += content + "\n\n"
+    tex_content += _segments_to_tex(parse_latex_segments(content)) + "\n\n"
     tex_content += "\\end{document}\n"
     
     return tex_content
\ No newline at end of file
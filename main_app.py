@@ -1,62 +1,81 @@
 import streamlit as st
 from datetime import datetime
-from database import create_post, get_posts, toggle_like, user_liked_post, get_comments, create_comment
-from latex_utils import render_latex, export_to_tex, escape_html
+from database import (create_post, get_posts, load_post_bodies, toggle_like, get_comments, create_comment,
+                      get_like_version, load_liked_posts, load_liked_posts_chunk)
+from jobs import enqueue_job, get_job, get_job_result, cancel_job, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_CANCELLED
+from latex_utils import (render_latex, render_latex_blocks, export_to_tex, escape_html, validate_latex,
+                         latex_warnings, latex_search_text)
 
+@st.fragment
 def show_create_post():
-    """Exibe interface para criar novo post."""
+    """Exibe interface para criar novo post.
+    
+    Roda como fragmento: editar o texto reexecuta só o editor e o preview,
+    sem recarregar o feed.
+    """
     st.subheader("Criar Novo Post")
     
     # Inicializa variáveis no session_state se não existirem
     if 'last_post_data' not in st.session_state:
         st.session_state.last_post_data = None
     
-    with st.form("create_post_form"):
-        title = st.text_input("Título do Post", max_chars=200)
-        content = st.text_area(
-            "Conteúdo (LaTeX suportado)", 
-            height=200,
-            help="Use $...$ para matemática inline, $$...$$ ou \\[...\\] para display math. Suporta química com \\ce{}"
+    # Mensagem do post publicado na execução anterior
+    if 'post_published_message' in st.session_state:
+        st.markdown(f'<div class="success-message">{st.session_state.pop("post_published_message")}</div>', unsafe_allow_html=True)
+        st.info("Post publicado! Vá para a aba Feed para ver.")
+    
+    # Widgets fora de st.form para que o preview acompanhe a edição
+    title = st.text_input("Título do Post", max_chars=200, key="new_post_title")
+    content = st.text_area(
+        "Conteúdo (LaTeX suportado)", 
+        height=200,
+        key="new_post_content",
+        help="Use $...$ para matemática inline, $$...$$ ou \\[...\\] para display math. Suporta química com \\ce{}"
+    )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        show_preview = st.checkbox("Mostrar Preview", value=False)
+    with col2:
+        submit_post = st.button("Publicar Post")
+    
+    # Preview ao vivo, com os erros de delimitadores apontados antes de publicar
+    if show_preview and content:
+        st.subheader("Preview:")
+        is_valid, message = validate_latex(content)
+        if not is_valid:
+            st.markdown(f'<div class="error-message">{escape_html(message)}</div>', unsafe_allow_html=True)
+        for warning in latex_warnings(content):
+            st.warning(warning)
+        # Um elemento por bloco: só os blocos editados são substituídos
+        with st.container(border=True):
+            render_latex_blocks(content, "preview")
+    
+    # Submissão
+    if submit_post:
+        user = st.session_state.user
+        success, message = create_post(
+            user['id'], 
+            user['email'], 
+            user['name'], 
+            title, 
+            content
         )
         
-        col1, col2 = st.columns(2)
-        with col1:
-            show_preview = st.checkbox("Mostrar Preview", value=False)
-        with col2:
-            submit_post = st.form_submit_button("Publicar Post")
-        
-        # Preview dentro do form
-        if show_preview and content:
-            st.subheader("Preview:")
-            with st.container():
-                st.markdown('<div class="preview-box">', unsafe_allow_html=True)
-                render_latex(content, f"preview-{hash(content)}")
-                st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Submissão
-        if submit_post:
-            user = st.session_state.user
-            success, message = create_post(
-                user['id'], 
-                user['email'], 
-                user['name'], 
-                title, 
-                content
-            )
-            
-            if success:
-                st.markdown(f'<div class="success-message">{message}</div>', unsafe_allow_html=True)
-                # Armazena dados do post para exportação
-                st.session_state.last_post_data = {
-                    'title': title,
-                    'content': content,
-                    'author': user['name']
-                }
-                st.info("Post publicado! Vá para a aba Feed para ver.")
-            else:
-                st.markdown(f'<div class="error-message">{message}</div>', unsafe_allow_html=True)
+        if success:
+            # Armazena dados do post para exportação
+            st.session_state.last_post_data = {
+                'title': title,
+                'content': content,
+                'author': user['name']
+            }
+            # Reexecuta o app inteiro para o novo post aparecer no feed
+            st.session_state.post_published_message = message
+            st.rerun()
+        else:
+            st.markdown(f'<div class="error-message">{escape_html(message)}</div>', unsafe_allow_html=True)
     
-    # Botão de exportar fora do form
+    # Botão de exportar
     if st.session_state.last_post_data:
         st.subheader("Exportar Último Post")
         post_data = st.session_state.last_post_data
@@ -79,15 +98,95 @@ def show_create_post():
                     key="download_tex"
                 )
 
+def show_bulk_export():
+    """Exporta todos os posts do usuário em segundo plano, com progresso."""
+    st.subheader("Exportar Todos os Meus Posts")
+    user = st.session_state.user
+    
+    if 'export_job_id' not in st.session_state:
+        st.session_state.export_job_id = None
+    
+    job = get_job(st.session_state.export_job_id) if st.session_state.export_job_id else None
+    
+    if job is None or job['status'] in (JOB_DONE, JOB_FAILED, JOB_CANCELLED):
+        if st.button("📦 Gerar .zip com todos os posts", key="start_bulk_export"):
+            st.session_state.export_job_id = enqueue_job('export_tex', {'user_id': user['id']}, user['id'])
+            st.rerun()
+    
+    if job is None:
+        return
+    
+    if job['status'] in (JOB_QUEUED, JOB_RUNNING):
+        st.progress(job['progress'], text="Na fila..." if job['status'] == JOB_QUEUED else "Exportando...")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🔄 Atualizar", key="refresh_bulk_export"):
+                st.rerun()
+        with col2:
+            if st.button("Cancelar", key="cancel_bulk_export"):
+                cancel_job(job['id'])
+                st.rerun()
+    elif job['status'] == JOB_DONE and not job['has_result']:
+        st.info("O arquivo expirou. Gere a exportação novamente.")
+    elif job['status'] == JOB_DONE:
+        # O .zip só é lido do banco quando o usuário pede o download
+        if st.session_state.get('export_download_job') != job['id']:
+            if st.button("📥 Preparar download", key="prepare_bulk_export"):
+                st.session_state.export_download_job = job['id']
+                st.rerun()
+        else:
+            data = get_job_result(job['id'])
+            if data is None:
+                st.info("O arquivo expirou. Gere a exportação novamente.")
+            else:
+                st.download_button(
+                    label="Download .zip",
+                    data=data,
+                    file_name="mathgram_posts.zip",
+                    mime="application/zip",
+                    key="download_bulk_export",
+                    on_click=lambda: st.session_state.pop('export_download_job', None)
+                )
+    elif job['status'] == JOB_FAILED:
+        st.markdown(f'<div class="error-message">Erro na exportação: {escape_html(job["error"] or "")}</div>', unsafe_allow_html=True)
+    else:
+        st.info("Exportação cancelada.")
+
+# Quantidade de posts carregados por página do feed
+FEED_PAGE_SIZE = 20
+
+def get_liked_cache(post_ids: list) -> dict:
+    """Retorna o conjunto de posts curtidos guardado na sessão, recarregando se outra sessão mudou os likes."""
+    user_id = st.session_state.user['id']
+    cache = st.session_state.get('liked_cache')
+    if cache is None or cache['user_id'] != user_id or cache['version'] != get_like_version(user_id):
+        cache = load_liked_posts(user_id)
+        st.session_state.liked_cache = cache
+    load_liked_posts_chunk(cache, post_ids)
+    return cache
+
 def show_feed():
     """Exibe feed de posts."""
     st.subheader("Feed")
     
-    posts = get_posts()
+    if 'feed_limit' not in st.session_state:
+        st.session_state.feed_limit = FEED_PAGE_SIZE
+    
+    posts = get_posts(limit=st.session_state.feed_limit)
+    load_post_bodies(posts)
+    has_more = len(posts) >= st.session_state.feed_limit
+    
+    # Busca no texto e no corpo das fórmulas, sem os delimitadores LaTeX
+    query = st.text_input("🔎 Buscar nos posts carregados", key="feed_search").strip().lower()
+    if query:
+        posts = [post for post in posts if query in f"{post['title']} {latex_search_text(post['content'])}".lower()]
+    
+    liked_cache = get_liked_cache([post['id'] for post in posts])
     
     if not posts:
-        st.info("Nenhum post ainda. Seja o primeiro a postar!")
-        return
+        st.info("Nenhum post encontrado." if query else "Nenhum post ainda. Seja o primeiro a postar!")
+        if not has_more:
+            return
     
     for post in posts:
         # Container do post
@@ -107,11 +206,14 @@ def show_feed():
             
             with col3:
                 # Botão de like
-                user_liked = user_liked_post(post['id'], st.session_state.user['id'])
+                user_liked = post['id'] in liked_cache['post_ids']
                 like_icon = "❤️" if user_liked else "🤍"
                 if st.button(f"{like_icon} {post['likes']}", key=f"like_{post['id']}"):
-                    if toggle_like(post['id'], st.session_state.user['id']):
+                    success, message = toggle_like(post['id'], st.session_state.user['id'], liked_cache)
+                    if success:
                         st.rerun()
+                    else:
+                        st.warning(message)
             
             # Conteúdo do post
             st.markdown("**Conteúdo:**")
@@ -168,6 +270,12 @@ def show_feed():
             
             # Separador
             st.markdown("---")
+    
+    # Posts antigos (inclusive arquivados) são carregados sob demanda
+    if has_more:
+        if st.button("Carregar mais posts", key="load_more_posts"):
+            st.session_state.feed_limit += FEED_PAGE_SIZE
+            st.rerun()
 
 def show_main_app():
     """Exibe interface principal do aplicativo."""
@@ -181,6 +289,7 @@ def show_main_app():
     with col3:
         if st.button("Sair", key="logout"):
             del st.session_state.user
+            st.session_state.pop('liked_cache', None)
             st.rerun()
     
     # Navegação
@@ -188,6 +297,7 @@ def show_main_app():
     
     with tab1:
         show_create_post()
+        show_bulk_export()
     
     with tab2:
         show_feed()
\ No newline at end of file
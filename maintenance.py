@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import threading
+import time
+from database import DB_PATH, ARCHIVE_DB_PATH, create_content_tables, has_archive
+from jobs import purge_old_jobs
+from ratelimit import get_rate_limit_stats
+
+# ================================
+# CONFIGURAÇÃO DA MANUTENÇÃO
+# ================================
+
+# Intervalos mínimos entre execuções de cada tarefa (segundos)
+TASK_INTERVALS = {
+    'analyze': 6 * 60 * 60,
+    'incremental_vacuum': 24 * 60 * 60,
+    'checkpoint': 15 * 60,
+    'archive': 24 * 60 * 60,
+    'purge_jobs': 60 * 60,
+}
+
+# Posts mais antigos que isso vão para o arquivo morto
+ARCHIVE_AFTER_DAYS = 365
+
+# Tempo sem escritas para considerar o banco ocioso (segundos)
+IDLE_SECONDS = 60
+
+# Páginas liberadas por execução do incremental_vacuum (0 = todas)
+INCREMENTAL_VACUUM_PAGES = 1000
+
+# Frequência com que maybe_run_maintenance consulta o banco (segundos)
+CHECK_INTERVAL = 60
+
+# Intervalo mínimo entre registros dos contadores do limitador (segundos)
+RATE_LIMIT_LOG_INTERVAL = 15 * 60
+
+_maintenance_lock = threading.Lock()
+_next_check = 0.0
+_next_rate_limit_log = 0.0
+_logged_rate_limit_stats = None
+
+def _connect() -> sqlite3.Connection:
+    """Abre conexão em modo autocommit, necessário para VACUUM e checkpoints."""
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_log (
+            task TEXT PRIMARY KEY,
+            last_run TIMESTAMP NOT NULL
+        )
+    ''')
+    return conn
+
+def _last_run(conn: sqlite3.Connection, task: str) -> float:
+    """Retorna o timestamp da última execução da tarefa (0 se nunca rodou)."""
+    row = conn.execute(
+        "SELECT strftime('%s', last_run) FROM maintenance_log WHERE task = ?",
+        (task,)
+    ).fetchone()
+    return float(row[0]) if row else 0.0
+
+def _mark_run(conn: sqlite3.Connection, task: str):
+    """Registra a execução da tarefa."""
+    conn.execute(
+        "INSERT OR REPLACE INTO maintenance_log (task, last_run) VALUES (?, CURRENT_TIMESTAMP)",
+        (task,)
+    )
+
+def is_idle(conn: sqlite3.Connection, idle_seconds: int = IDLE_SECONDS) -> bool:
+    """Verifica se não houve posts, comentários ou likes recentes."""
+    for table in ('posts', 'comments', 'likes'):
+        row = conn.execute(
+            f"SELECT strftime('%s', 'now') - strftime('%s', created_at) FROM {table} ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        if row and row[0] is not None and row[0] < idle_seconds:
+            return False
+    return True
+
+def run_analyze(conn: sqlite3.Connection):
+    """Atualiza as estatísticas usadas pelo planejador de consultas."""
+    conn.execute("ANALYZE")
+
+def run_incremental_vacuum(conn: sqlite3.Connection, pages: int = INCREMENTAL_VACUUM_PAGES):
+    """Devolve páginas livres ao sistema de arquivos.
+
+    Bancos criados antes do auto_vacuum incremental precisam de um VACUUM
+    completo (uma única vez) para passar a suportá-lo.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+
+def run_checkpoint(conn: sqlite3.Connection):
+    """Transfere o WAL para o banco e trunca o arquivo de log."""
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+# Colunas copiadas para o arquivo morto, nomeadas porque cada banco é migrado
+# separadamente e a ordem das colunas pode divergir
+ARCHIVE_COLUMNS = {
+    'posts': 'id, user_id, email, author_name, title, content, likes, created_at, body_hash',
+    'comments': 'id, post_id, user_id, email, author_name, content, created_at, body_hash',
+    'likes': 'id, post_id, user_id, created_at',
+}
+
+def archive_old_posts(conn: sqlite3.Connection, max_age_days: int = ARCHIVE_AFTER_DAYS) -> int:
+    """Move posts antigos, com seus comentários e likes, para o arquivo morto.
+
+    Comentários e likes feitos em posts já arquivados também são movidos.
+    O arquivo morto só é criado quando há posts a arquivar.
+    Retorna o número de posts arquivados.
+    """
+    cutoff = f"-{int(max_age_days)} days"
+    if not has_archive(conn):
+        if not os.path.exists(ARCHIVE_DB_PATH):
+            row = conn.execute(
+                "SELECT 1 FROM main.posts WHERE created_at < datetime('now', ?) LIMIT 1",
+                (cutoff,)
+            ).fetchone()
+            if row is None:
+                return 0
+        conn.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_PATH,))
+    create_content_tables(conn.cursor(), 'archive')
+
+    posts, comments, likes = ARCHIVE_COLUMNS['posts'], ARCHIVE_COLUMNS['comments'], ARCHIVE_COLUMNS['likes']
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.execute(
+            f"INSERT INTO archive.posts ({posts}) SELECT {posts} FROM main.posts WHERE created_at < datetime('now', ?)",
+            (cutoff,)
+        )
+        archived = cursor.rowcount
+
+        conn.execute(f'''
+            INSERT OR IGNORE INTO archive.comments ({comments})
+            SELECT {comments} FROM main.comments WHERE post_id IN (SELECT id FROM archive.posts)
+        ''')
+        conn.execute(f'''
+            INSERT OR IGNORE INTO archive.likes ({likes})
+            SELECT {likes} FROM main.likes WHERE post_id IN (SELECT id FROM archive.posts)
+        ''')
+        conn.execute("DELETE FROM main.likes WHERE post_id IN (SELECT id FROM archive.posts)")
+        conn.execute("DELETE FROM main.comments WHERE post_id IN (SELECT id FROM archive.posts)")
+        conn.execute("DELETE FROM main.posts WHERE id IN (SELECT id FROM archive.posts)")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    return archived
+
+MAINTENANCE_TASKS = {
+    'archive': archive_old_posts,
+    'purge_jobs': purge_old_jobs,
+    'analyze': run_analyze,
+    'incremental_vacuum': run_incremental_vacuum,
+    'checkpoint': run_checkpoint,
+}
+
+def run_maintenance(force: bool = False) -> list[str]:
+    """Executa as tarefas de manutenção vencidas, se o banco estiver ocioso.
+
+    Retorna a lista de tarefas executadas.
+    """
+    executed = []
+    conn = _connect()
+    try:
+        if not force and not is_idle(conn):
+            return executed
+
+        now = time.time()
+        for task, function in MAINTENANCE_TASKS.items():
+            if not force and now - _last_run(conn, task) < TASK_INTERVALS[task]:
+                continue
+            try:
+                function(conn)
+                _mark_run(conn, task)
+                executed.append(task)
+            except Exception as e:
+                print(f"Erro na manutenção ({task}): {str(e)}")
+    finally:
+        conn.close()
+    return executed
+
+def log_rate_limit_stats():
+    """Registra os contadores de aceitas e recusadas do limitador, se mudaram.
+
+    Roda no máximo uma vez por RATE_LIMIT_LOG_INTERVAL, independente do
+    banco estar ocioso.
+    """
+    global _next_rate_limit_log, _logged_rate_limit_stats
+    now = time.time()
+    if now < _next_rate_limit_log:
+        return
+    _next_rate_limit_log = now + RATE_LIMIT_LOG_INTERVAL
+
+    stats = get_rate_limit_stats()
+    if stats == _logged_rate_limit_stats:
+        return
+    _logged_rate_limit_stats = stats
+    counters = '; '.join(
+        f"{action}: {counts['accepted']} aceitas, {counts['rejected']} recusadas"
+        for action, counts in stats.items()
+        if counts['accepted'] or counts['rejected']
+    )
+    print(f"Limitador de requisições: {counters or 'nenhuma chamada'}")
+
+def _run_in_background():
+    """Executa a manutenção e libera o lock ao final."""
+    try:
+        try:
+            log_rate_limit_stats()
+        except Exception as e:
+            print(f"Erro ao registrar contadores do limitador: {str(e)}")
+        run_maintenance()
+    finally:
+        _maintenance_lock.release()
+
+def maybe_run_maintenance():
+    """Dispara a manutenção em segundo plano, no máximo uma vez por CHECK_INTERVAL.
+
+    Chamada a cada rerun; não bloqueia a sessão do usuário.
+    """
+    global _next_check
+    now = time.time()
+    if now < _next_check:
+        return
+    if not _maintenance_lock.acquire(blocking=False):
+        return
+    _next_check = now + CHECK_INTERVAL
+    threading.Thread(target=_run_in_background, name="mathgram-maintenance", daemon=True).start()
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import streamlit as st
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:
+    get_script_run_ctx = None
+
+# ================================
+# ORÇAMENTOS DE REQUISIÇÕES
+# ================================
+
+# ação -> escopo -> (capacidade do balde, fichas repostas por segundo)
+# Escopos: 'user' (id ou email do usuário) e 'client' (IP ou sessão)
+RATE_LIMITS = {
+    'create_post': {'user': (5, 1 / 30), 'client': (10, 1 / 15)},
+    'create_comment': {'user': (10, 1 / 6), 'client': (20, 1 / 3)},
+    'toggle_like': {'user': (30, 2.0), 'client': (60, 4.0)},
+    'create_user': {'client': (3, 1 / 60)},
+    'authenticate_user': {'user': (5, 1 / 12), 'client': (10, 1 / 6)},
+}
+
+# Mensagens exibidas quando a requisição é recusada
+RATE_LIMIT_MESSAGES = {
+    'create_post': "Você está publicando rápido demais.",
+    'create_comment': "Você está comentando rápido demais.",
+    'toggle_like': "Muitas curtidas em sequência.",
+    'create_user': "Muitos cadastros a partir desta conexão.",
+    'authenticate_user': "Muitas tentativas de login.",
+}
+
+# Acima disso, os baldes usados há mais tempo são descartados
+MAX_BUCKETS = 10000
+
+# (ação, escopo, chave) -> [fichas, último reabastecimento], em ordem LRU
+_buckets: "OrderedDict[tuple, list]" = OrderedDict()
+_stats: Dict[str, Dict[str, int]] = {action: {'accepted': 0, 'rejected': 0} for action in RATE_LIMITS}
+_lock = threading.Lock()
+
+def current_client_id() -> Optional[str]:
+    """Identifica o cliente da execução atual pelo IP ou, na falta dele, pela sessão."""
+    try:
+        ip_address = getattr(getattr(st, 'context', None), 'ip_address', None)
+        if ip_address:
+            return f"ip:{ip_address}"
+        ctx = get_script_run_ctx() if get_script_run_ctx else None
+        if ctx is not None:
+            return f"session:{ctx.session_id}"
+    except Exception:
+        pass
+    return None
+
+def check_rate_limit(action: str, user: Optional[object] = None, client: Optional[str] = None) -> tuple[bool, str]:
+    """Consome uma ficha de cada balde (usuário e cliente) da ação.
+
+    A requisição só é aceita se houver ficha em todos os baldes; caso
+    contrário nada é consumido e a mensagem informa quanto esperar.
+    """
+    limits = RATE_LIMITS.get(action)
+    if not limits:
+        return True, ""
+
+    now = time.monotonic()
+    with _lock:
+        buckets = []
+        for scope, key in (('user', user), ('client', client)):
+            if key is None or scope not in limits:
+                continue
+            capacity, rate = limits[scope]
+            bucket_key = (action, scope, key)
+            bucket = _buckets.get(bucket_key)
+            if bucket is None:
+                bucket = _buckets[bucket_key] = [capacity, now]
+                # Descarta o balde mais frio: custo O(1) por balde criado
+                if len(_buckets) > MAX_BUCKETS:
+                    _buckets.popitem(last=False)
+            else:
+                _buckets.move_to_end(bucket_key)
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                _stats[action]['rejected'] += 1
+                wait = int((1 - bucket[0]) / rate) + 1
+                return False, f"{RATE_LIMIT_MESSAGES[action]} Tente novamente em {wait}s."
+            buckets.append(bucket)
+
+        for bucket in buckets:
+            bucket[0] -= 1
+        _stats[action]['accepted'] += 1
+
+    return True, ""
+
+def get_rate_limit_stats() -> Dict[str, Dict[str, int]]:
+    """Retorna os contadores de chamadas aceitas e recusadas por ação."""
+    with _lock:
+        return {action: dict(counters) for action, counters in _stats.items()}